@@ -1,11 +1,17 @@
 # ----- Standard library imports (built into Python) -----
 import os                  # Lets us read environment variables (e.g., your Influx token)
+import sys                 # Gives access to the console output stream
 import time                # Provides timestamps and delays
 import struct              # Helps unpack bytes into integers/floats in a reliable way
+import threading           # Semaphore used to cap how many batches wait to be written
+import logging             # Status output ([OK], [FLUSH], [TELEM], ...) with adjustable verbosity
+from binascii import hexlify  # Turns bytes into hex digits (as bytes, not str)
 
 # ----- Third-party library imports (you install these with pip) -----
 import can                 # python-can library for reading CAN messages from an adapter
-from influxdb_client_3 import InfluxDBClient3  # InfluxDB 3 Core Python client for writing data
+from can.exceptions import error_check  # Wraps serial errors in python-can's own exception types
+from can.interfaces.slcan import slcanBus  # python-can's SLCAN driver (we speed up its serial reads below)
+from influxdb_client_3 import InfluxDBClient3, WriteOptions, write_client_options  # InfluxDB 3 Core Python client
 
 
 # ================== USER SETTINGS ==================
@@ -20,6 +26,13 @@ SERIAL_BAUD = 115200
 # CAN bus bitrate. Orion is commonly 500 kbit/s, but use whatever your bus is set to.
 CAN_BITRATE = 500000
 
+# Which python-can interface to read from. "slcan" is the CANdapter on COM_PORT above.
+# If the logging laptop has a native CAN adapter instead (ex: "pcan", or "socketcan" on Linux),
+# set it here along with its channel name (ex: "PCAN_USBBUS1" or "can0"); this skips the
+# slow serial link entirely.
+CAN_INTERFACE = "slcan"
+CAN_CHANNEL = ""  # Only used when CAN_INTERFACE is not "slcan"
+
 # InfluxDB 3 Core address. If InfluxDB is running on the same laptop, localhost is correct.
 INFLUX_HOST = "http://127.0.0.1:8181"
 
@@ -42,194 +55,456 @@ ENABLE_TELEM_DECODE = False      # Set True only after you configure your teleme
 TELEM_CAN_ID = 0x6B0             # Example ID; replace with your actual configured telemetry ID
 TELEM_EXTENDED_ID = False        # True if your telemetry message uses 29-bit extended IDs
 
+# OPTIONAL: Only log these CAN IDs (ex: [0x6B0, 0x6B1]). Useful when a few noisy high-rate IDs
+# would otherwise swamp the logger. Both lists empty = log every ID.
+# Standard (11-bit) IDs go in CAN_ID_ALLOWLIST, extended (29-bit) IDs in CAN_ID_ALLOWLIST_EXT.
+# The telemetry ID above is always let through while decoding is on.
+CAN_ID_ALLOWLIST: list[int] = []
+CAN_ID_ALLOWLIST_EXT: list[int] = []
+
 # Measurement names (like tables). Grafana will query these.
 RAW_MEASUREMENT = "bms_can_raw"       # Stores raw CAN frames
 TELEM_MEASUREMENT = "bms_telemetry"   # Stores decoded telemetry fields
 
 # Write batching settings to avoid writing one point at a time (faster + less overhead).
-BATCH_SIZE = 200          # How many points we buffer before writing
-FLUSH_INTERVAL_S = 1.0    # Max time we wait before forcing a write
+# Every write to InfluxDB pays a fixed per-request cost, which dominates below roughly 500 points,
+# so bigger batches mean much higher throughput (InfluxDB recommends batches in the thousands).
+# The size limit also caps memory if a burst of frames arrives faster than we can write.
+# Override via env vars BATCH_SIZE and FLUSH_INTERVAL_S.
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "1000"))             # How many points we buffer before writing
+FLUSH_INTERVAL_S = float(os.getenv("FLUSH_INTERVAL_S", "1.0"))  # Max time we wait before forcing a write
+
+# If InfluxDB stops answering, finished batches wait in memory while the client retries them.
+# At most this many can wait; after that the receive loop pauses until one is written (or given up on),
+# so memory use stays capped. A batch that still fails after 10 s (or 10 flush intervals, if that's
+# longer) is dropped with an [ERROR].
+MAX_PENDING_BATCHES = 10
+
+# Console output. LOG_LEVEL=WARNING hides the routine [FLUSH]/[TELEM] lines; DEBUG shows every telemetry frame.
+# Writing to the console on every frame slows the receive loop down, so by default only every
+# TELEM_LOG_EVERY-th telemetry frame is shown (10 = about once a second at Orion's ~100 ms rate).
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+TELEM_LOG_EVERY = max(1, int(os.getenv("TELEM_LOG_EVERY", "10")))
 
 
 # ======================================================
 
 
-def now_ns() -> int:
+# Logger for everything this script prints.
+log = logging.getLogger("candapter")
+
+# Precompiled layout of your single custom telemetry CAN message (optional).
+# Expected 8-byte payload layout (you must configure Orion to transmit this layout):
+#   bytes 0-1: pack_voltage (uint16 little-endian) in 0.1 V  -> value/10
+#   bytes 2-3: pack_current (int16  little-endian) in 0.1 A  -> value/10
+#   byte 4:    soc (uint8) in 0.5 %                          -> value/2
+#   byte 5:    avg_temp (uint8) degC
+#   byte 6:    max_temp (uint8) degC
+#   byte 7:    fault_flag (uint8) (0/1 or bitfield)
+# Building the Struct once at startup means Python doesn't re-parse the format string on every frame.
+#   <  = little endian
+#   H  = pack_voltage (uint16), h = pack_current (int16), BBBB = soc, avg_temp, max_temp, fault_flag
+# Scaling to engineering units happens in to_line_protocol_telem().
+_TELEM_STRUCT = struct.Struct("<HhBBBB")
+
+# Line-protocol row templates ("measurement,tags fields timestamp\n"), built as bytes once at startup.
+# The measurement and tags never change, so they're baked in; each frame only fills in its own
+# field values + timestamp with bytes %-formatting, which produces the finished row in one allocation.
+#   %b = bytes as-is, %a = float as text (same digits as str()), %d = integer
+_RAW_LINE = (
+    f"{RAW_MEASUREMENT},car_id={CAR_ID},source=candapter ".encode()
+    + b'arb_id=%di,is_ext=%di,dlc=%di,data_hex="%b" %d\n'
+)
+_TELEM_LINE = (
+    f"{TELEM_MEASUREMENT},car_id={CAR_ID},source=bms ".encode()
+    + b'pack_voltage=%a,pack_current=%a,soc=%a,avg_temp=%d.0,max_temp=%d.0,fault_flag=%di %d\n'
+)
+
+
+class BulkReadSlcanBus(slcanBus):
     """
-    Returns current time in nanoseconds.
-    InfluxDB 3 Core supports nanosecond timestamps.
+    python-can's SLCAN driver, but reading the serial port in bulk.
+
+    The stock driver calls read(1) once per byte, so every ~27-byte CAN frame costs ~27 serial
+    reads, each of which can wait on the serial timeout. This version reads everything the port
+    already has waiting in one call and splits complete SLCAN responses out of the buffer.
+
+    This replaces a private method and uses the stock driver's private state, so main() only uses
+    it where that driver is known to match (see slcan_needs_bulk_reader()).
     """
-    return time.time_ns()
 
+    def _read(self, timeout: float | None) -> str | None:
+        # timeout=None means wait forever, like the stock driver.
+        deadline = float("inf") if timeout is None else time.monotonic() + timeout
+        port = self.serialPortOrig
+        buf = self._buffer
+
+        with error_check("Could not read from serial device"):
+            while True:
+                # SLCAN responses end in CR (OK) or BEL (error). Hand back the first complete one.
+                end = buf.find(self._OK)
+                err = buf.find(self._ERROR)
+                if err != -1 and (end == -1 or err < end):
+                    end = err
+                if end != -1:
+                    string = buf[:end + 1].decode()
+                    del buf[:end + 1]
+                    return string
+
+                # Read all bytes waiting in the port at once (at least 1, which blocks up to the port timeout).
+                chunk = port.read(max(1, port.in_waiting))
+                if chunk:
+                    buf += chunk
+                elif time.monotonic() >= deadline:
+                    return None
+
+
+def slcan_needs_bulk_reader() -> bool:
+    """
+    True if the installed python-can still has the byte-at-a-time SLCAN reader that
+    BulkReadSlcanBus replaces (python-can 4.6 and older, with the parts we override still there).
+    On anything newer, the stock driver is used as-is rather than risk overriding code that changed.
+    """
+    try:
+        major, minor = (int(part) for part in can.__version__.split(".")[:2])
+    except ValueError:
+        return False  # Unusual version string (ex: a development build); play it safe
+    return (major, minor) < (4, 7) and all(hasattr(slcanBus, name) for name in ("_read", "_OK", "_ERROR"))
 
-def decode_custom_telem(payload: bytes) -> dict:
+
+def to_line_protocol_raw(arb: int, ext: bool, dlc: int, data: bytearray, ts_ns: int) -> bytes:
     """
-    Decode your single custom telemetry CAN message (optional).
+    Convert a raw CAN frame into one newline-terminated InfluxDB line-protocol row (as bytes).
+    Stores arbitration ID + DLC + extended flag + data payload as hex.
+    Takes the frame's fields (already pulled off the can.Message by the caller) rather than the message.
 
-    Expected 8-byte payload layout (you must configure Orion to transmit this layout):
-      bytes 0-1: pack_voltage (uint16 little-endian) in 0.1 V  -> value/10
-      bytes 2-3: pack_current (int16  little-endian) in 0.1 A  -> value/10
-      byte 4:    soc (uint8) in 0.5 %                          -> value/2
-      byte 5:    avg_temp (uint8) degC
-      byte 6:    max_temp (uint8) degC
-      byte 7:    fault_flag (uint8) (0/1 or bitfield)
+    Example line protocol:
+      bms_can_raw,car_id=sunstang24,source=candapter arb_id=123i,is_ext=0i,dlc=8i,data_hex="00112233..." 1234567890
     """
-    # If the message is shorter than 8 bytes, we cannot decode it reliably.
-    if len(payload) < 8:
-        return {}
+    # Fill in the row template. hexlify() gives the payload's hex digits as bytes, so there's
+    # no str round trip to encode. Hex digits never need line-protocol escaping.
+    return _RAW_LINE % (arb, ext, dlc, hexlify(data), ts_ns)
 
-    # Unpack pack voltage (unsigned 16-bit) starting at byte 0 (little endian).
-    pv_raw = struct.unpack_from("<H", payload, 0)[0]
 
-    # Unpack pack current (signed 16-bit) starting at byte 2 (little endian).
-    pc_raw = struct.unpack_from("<h", payload, 2)[0]
+def to_line_protocol_telem(pv_raw: int, pc_raw: int, soc_raw: int, avg_t: int, max_t: int, fault: int,
+                           ts_ns: int) -> bytes:
+    """
+    Convert a decoded telemetry frame (the raw integers unpacked with _TELEM_STRUCT) into
+    one newline-terminated InfluxDB line-protocol row (as bytes).
+    The field set is fixed, so it is one row template with the unit scaling inline.
+    fault_flag is an integer field and gets an 'i' suffix; the rest are floats.
+    """
+    # Fill in the six known fields + timestamp.
+    # avg_temp/max_temp are whole degrees but stored as float fields, hence the ".0" in the template.
+    return _TELEM_LINE % (pv_raw / 10.0, pc_raw / 10.0, soc_raw / 2.0, avg_t, max_t, fault, ts_ns)
 
-    # Byte 4 is SOC.
-    soc_raw = payload[4]
 
-    # Byte 5 is average temperature.
-    avg_t = payload[5]
+# Running count of points InfluxDB has accepted (just for feedback).
+_points_written = 0
 
-    # Byte 6 is max temperature.
-    max_t = payload[6]
+# One slot per batch that may be waiting in the Influx client to be written. hand_off_batch() takes
+# a slot for each batch, and the write callbacks below give it back once that batch is written (or
+# given up on). Running out of slots is what caps the backlog.
+_pending_batches = threading.BoundedSemaphore(MAX_PENDING_BATCHES)
 
-    # Byte 7 is fault flag (or bitfield).
-    fault = payload[7]
 
-    # Convert to engineering units.
-    return {
-        "pack_voltage": pv_raw / 10.0,     # 0.1 V resolution
-        "pack_current": pc_raw / 10.0,     # 0.1 A resolution
-        "soc": soc_raw / 2.0,              # 0.5% resolution
-        "avg_temp": float(avg_t),          # degC
-        "max_temp": float(max_t),          # degC
-        "fault_flag": int(fault),          # int field
-    }
+def on_write_success(conf: tuple, data: bytes) -> None:
+    """
+    Called by the Influx client (on its background writer thread) after a batch is written.
+    """
+    global _points_written
+    points = data.count(b"\n")  # One newline-terminated row per point
+    _points_written += points
+    _pending_batches.release()  # This batch is done; free its slot
+    log.info("[FLUSH] wrote %d points (total=%d)", points, _points_written)
 
 
-def lp_escape_str(s: str) -> str:
+def on_write_error(conf: tuple, data: bytes, exception: Exception) -> None:
     """
-    Minimal escaping for Influx line protocol string fields.
+    Called by the Influx client when a batch could not be written, even after retrying.
     """
-    return s.replace("\\", "\\\\").replace('"', '\\"')
+    points = data.count(b"\n")
+    _pending_batches.release()  # This batch is done; free its slot
+    log.error("[ERROR] Influx write failed, dropped %d points: %s", points, exception)
 
 
-def to_line_protocol_raw(msg: can.Message, ts_ns: int) -> str:
+def on_write_retry(conf: tuple, data: bytes, exception: Exception) -> None:
     """
-    Convert a raw CAN frame into InfluxDB line protocol.
-    Stores arbitration ID + DLC + extended flag + data payload as hex.
+    Called by the Influx client when a write failed but will be retried.
+    """
+    log.warning("[WARN] Influx write failed, retrying: %s", exception)
 
-    Example line protocol:
-      bms_can_raw,car_id=sunstang24,source=candapter arb_id=123i,is_ext=0i,dlc=8i,data_hex="00112233..." 1234567890
+
+def hand_off_batch(influx: InfluxDBClient3, batch: bytearray) -> None:
     """
-    # Convert message data bytes into a hex string for storage.
-    data_hex = msg.data.hex()
+    Queue one finished batch with the Influx client's background writer.
+    If MAX_PENDING_BATCHES batches are already waiting (InfluxDB is down or too slow), wait for
+    one of them to be written or given up on first, instead of letting the backlog grow forever.
+    """
+    if not _pending_batches.acquire(blocking=False):
+        log.warning("[WARN] InfluxDB is falling behind; pausing CAN reads until a batch is written")
+        # Wait in 1 s steps rather than forever, so Ctrl+C still works while we wait.
+        while not _pending_batches.acquire(timeout=1.0):
+            pass
+    influx.write(record=bytes(batch), write_precision="ns")
 
-    # Construct line protocol string.
-    return (
-        f"{RAW_MEASUREMENT},car_id={CAR_ID},source=candapter "
-        f"arb_id={msg.arbitration_id}i,is_ext={int(msg.is_extended_id)}i,dlc={msg.dlc}i,"
-        f"data_hex=\"{lp_escape_str(data_hex)}\" "
-        f"{ts_ns}"
-    )
 
+def build_can_filters() -> list[dict] | None:
+    """
+    Work out which CAN IDs the bus should pass up to us, as python-can filters.
+    Frames that don't match are dropped by the driver (or the adapter itself, if it supports
+    hardware filtering) before they ever reach our loop.
 
-def to_line_protocol_telem(fields: dict, ts_ns: int) -> str:
+    Returns None (no filtering) when every frame is wanted.
+    Never returns an empty list: python-can treats that the same as None (let everything through).
     """
-    Convert decoded telemetry fields into InfluxDB line protocol.
-    Integers get an 'i' suffix; floats are written as float fields.
+    # A standard ID has 11 bits and an extended one 29; anything bigger can't be on the bus.
+    for can_id in CAN_ID_ALLOWLIST:
+        if not 0 <= can_id <= 0x7FF:
+            raise SystemExit(f"CAN ID 0x{can_id:X} doesn't fit in 11 bits; list it as an extended ID instead.")
+    for can_id in CAN_ID_ALLOWLIST_EXT:
+        if not 0 <= can_id <= 0x1FFFFFFF:
+            raise SystemExit(f"CAN ID 0x{can_id:X} doesn't fit in 29 bits.")
+
+    if not WRITE_RAW_FRAMES:
+        # Only decoded telemetry is being logged, so nothing else is worth receiving.
+        # (main() refuses to start if decoding is off too, since then there'd be nothing to log.)
+        ids = [(TELEM_CAN_ID, TELEM_EXTENDED_ID)]
+    elif CAN_ID_ALLOWLIST or CAN_ID_ALLOWLIST_EXT:
+        ids = [(can_id, False) for can_id in CAN_ID_ALLOWLIST]
+        ids += [(can_id, True) for can_id in CAN_ID_ALLOWLIST_EXT]
+        if ENABLE_TELEM_DECODE:
+            ids.append((TELEM_CAN_ID, TELEM_EXTENDED_ID))
+    else:
+        return None
+
+    # Match all 11 (standard) or 29 (extended) ID bits exactly.
+    return [
+        {"can_id": can_id, "can_mask": 0x1FFFFFFF if extended else 0x7FF, "extended": extended}
+        for can_id, extended in ids
+    ]
+
+
+# How the Influx client's own failed/retried-write log messages start (see setup_logging()).
+_DUPLICATE_WRITE_LOGS = ("The batch item wasn't processed successfully", "The retriable error occurred")
+
+
+def _drop_duplicate_write_logs(record: logging.LogRecord) -> bool:
     """
-    # Build "field=value" parts.
-    parts = []
-    for k, v in fields.items():
-        # Influx line protocol requires integers have trailing 'i'
-        if isinstance(v, int):
-            parts.append(f"{k}={v}i")
-        else:
-            parts.append(f"{k}={float(v)}")
+    Logging filter: returns False (drop it) for a message on_write_error() / on_write_retry() already print.
+    """
+    return not str(record.msg).startswith(_DUPLICATE_WRITE_LOGS)
 
-    # Combine fields into one comma-separated field set.
-    field_str = ",".join(parts)
 
-    # Tags include car_id and source.
-    return f"{TELEM_MEASUREMENT},car_id={CAR_ID},source=bms {field_str} {ts_ns}"
+def setup_logging() -> None:
+    """
+    Send this script's status messages to the console (just the message text, like plain print()).
 
+    Only our own "candapter" logger is set up, so LOG_LEVEL=DEBUG shows every [TELEM] frame
+    without also turning on debug output from python-can, the Influx client and its HTTP library.
+    """
+    # Turn the LOG_LEVEL name into logging's number for it (ex: "INFO" -> 20).
+    level = logging.getLevelName(LOG_LEVEL)
+    if not isinstance(level, int):
+        raise SystemExit(f"LOG_LEVEL must be DEBUG, INFO, WARNING or ERROR (got {LOG_LEVEL!r}).")
 
-def main():
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(level)
+    log.propagate = False  # Don't also pass our messages up to Python's root logger
+
+    # The Influx client logs its own message for every failed or retried write, which
+    # on_write_error() / on_write_retry() already report, so drop just those duplicates.
+    # Its other warnings and errors (ex: its background writer dying) still get printed.
+    logging.getLogger("influxdb_client_3.write_client.client.write_api").addFilter(_drop_duplicate_write_logs)
+    logging.getLogger("influxdb_client.client.write.retry").addFilter(_drop_duplicate_write_logs)
+
+
+def main() -> None:
     """
     Main program loop:
     - Connect to InfluxDB
     - Connect to CAN adapter
     - Read CAN messages continuously
-    - Write raw frames and optionally decoded telemetry into InfluxDB
+    - Hand batches of raw frames and optionally decoded telemetry to the InfluxDB client's background writer
     """
+    # Show status messages on the console.
+    setup_logging()
+
     # Safety check: token must be present.
     if not INFLUX_TOKEN:
         raise SystemExit("Set INFLUXDB3_AUTH_TOKEN to your apiv3_... token first.")
 
-    # Create a client connection to InfluxDB 3 Core.
-    influx = InfluxDBClient3(host=INFLUX_HOST, database=INFLUX_DB, token=INFLUX_TOKEN)
-
-    # python-can expects the SLCAN channel in the format "COMx@baud".
-    # This baud is the serial baud, NOT the CAN bitrate.
-    channel = f"{COM_PORT}@{SERIAL_BAUD}"
+    # Safety check: batching settings must make sense.
+    if BATCH_SIZE <= 0:
+        raise SystemExit(f"BATCH_SIZE must be at least 1 (got {BATCH_SIZE}).")
+    if FLUSH_INTERVAL_S <= 0:
+        raise SystemExit(f"FLUSH_INTERVAL_S must be more than 0 seconds (got {FLUSH_INTERVAL_S}).")
+
+    # Safety check: at least one kind of data must be turned on.
+    if not (WRITE_RAW_FRAMES or ENABLE_TELEM_DECODE):
+        raise SystemExit("Nothing to log: turn on WRITE_RAW_FRAMES and/or ENABLE_TELEM_DECODE.")
+
+    # Work out the CAN ID filter now, so a bad allowlist is reported before anything is opened.
+    can_filters = build_can_filters()
+
+    # Create a client connection to InfluxDB 3 Core, in batching mode: write() only queues the
+    # data, and the client sends it from its own background thread, retrying transient network
+    # failures. The receive loop only waits if MAX_PENDING_BATCHES batches are already queued.
+    # We already group rows into batches of up to BATCH_SIZE below, so the client sends each
+    # batch we hand it straight away (batch_size=1) instead of collecting more (which also makes
+    # its own flush_interval irrelevant, so it isn't set).
+    # The client's default retry settings can keep retrying one batch for 3 minutes (holding up every
+    # batch behind it) and make close() wait up to 5 minutes, so retry timing is tied to FLUSH_INTERVAL_S:
+    # first retry after one flush interval, at most 3 retries, and give up after 10 flush intervals.
+    # On Ctrl+C, close() waits at most another 10 flush intervals for unsent batches.
+    # A short FLUSH_INTERVAL_S is about latency, not about how long InfluxDB may take to restart,
+    # so the retry interval never goes below 1 s (which makes those two limits at least 10 s).
+    retry_ms = max(int(FLUSH_INTERVAL_S * 1000), 1_000)
+    write_options = WriteOptions(
+        batch_size=1,
+        retry_interval=retry_ms,
+        max_retries=3,
+        max_retry_delay=4 * retry_ms,
+        max_retry_time=10 * retry_ms,
+        max_close_wait=10 * retry_ms,
+    )
+    influx = InfluxDBClient3(
+        host=INFLUX_HOST,
+        database=INFLUX_DB,
+        token=INFLUX_TOKEN,
+        write_client_options=write_client_options(
+            write_options=write_options,
+            success_callback=on_write_success,
+            error_callback=on_write_error,
+            retry_callback=on_write_retry,
+        ),
+    )
 
     # Create the CAN bus object. This opens the adapter so we can read frames.
-    bus = can.Bus(interface="slcan", channel=channel, bitrate=CAN_BITRATE)
+    bus: can.BusABC
+    if CAN_INTERFACE == "slcan":
+        # python-can expects the SLCAN channel in the format "COMx@baud".
+        # This baud is the serial baud, NOT the CAN bitrate.
+        channel = f"{COM_PORT}@{SERIAL_BAUD}"
+        if slcan_needs_bulk_reader():
+            bus = BulkReadSlcanBus(channel=channel, bitrate=CAN_BITRATE, can_filters=can_filters)
+        else:
+            bus = can.Bus(interface="slcan", channel=channel, bitrate=CAN_BITRATE, can_filters=can_filters)
+    else:
+        channel = CAN_CHANNEL
+        bus = can.Bus(interface=CAN_INTERFACE, channel=channel, bitrate=CAN_BITRATE, can_filters=can_filters)
 
     # Print status so you know it’s connected.
-    print(f"[OK] CAN connected: {channel} (CAN bitrate {CAN_BITRATE})")
-    print(f"[OK] Influx target: {INFLUX_HOST}  db={INFLUX_DB}")
-    print(f"[INFO] RAW logging: {WRITE_RAW_FRAMES}")
-    print(f"[INFO] TELEM decode: {ENABLE_TELEM_DECODE} (ID=0x{TELEM_CAN_ID:X})")
-
-    # Buffer for batched writes to InfluxDB.
-    batch = []
+    log.info("[OK] CAN connected: %s (CAN bitrate %d)", channel, CAN_BITRATE)
+    log.info("[OK] Influx target: %s  db=%s", INFLUX_HOST, INFLUX_DB)
+    log.info("[INFO] RAW logging: %s", WRITE_RAW_FRAMES)
+    log.info("[INFO] TELEM decode: %s (ID=0x%X)", ENABLE_TELEM_DECODE, TELEM_CAN_ID)
+    if can_filters is not None:
+        filter_ids = ", ".join(f"0x{f['can_id']:X}" + (" (ext)" if f["extended"] else "") for f in can_filters)
+        log.info("[INFO] CAN ID filter: %s", filter_ids)
+
+    # Buffer for batched writes to InfluxDB: newline-separated line-protocol rows, which is exactly
+    # the body InfluxDB's write endpoint expects, so a whole batch is sent as a single blob.
+    # n is how many points (rows) are in it.
+    batch = bytearray()
+    n = 0
+
+    # Bind the clock functions to local names once; the receive loop calls them on every frame.
+    # monotonic() is used for flush timing (unaffected by wall-clock jumps),
+    # time_ns() for the nanosecond timestamps InfluxDB 3 Core stores.
+    monotonic = time.monotonic
+    time_ns = time.time_ns
+    unpack_telem = _TELEM_STRUCT.unpack_from
 
     # Track the last time we flushed a batch.
-    last_flush = time.time()
-
-    # Track how many points we’ve written (just for feedback).
-    total = 0
-
-    # Loop forever, reading CAN frames.
-    while True:
-        # Receive one CAN message (blocking up to timeout seconds).
-        msg = bus.recv(timeout=1.0)
-
-        # If no message arrives, periodically flush any buffered data.
-        if msg is None:
-            if batch and (time.time() - last_flush) >= FLUSH_INTERVAL_S:
-                influx.write(record=batch, write_precision="ns")  # Write buffered points
-                total += len(batch)                              # Update total count
-                print(f"[FLUSH] wrote {len(batch)} points (total={total})")
-                batch.clear()                                    # Clear buffer after write
-                last_flush = time.time()                         # Reset flush timer
-            continue
-
-        # Timestamp this message (in ns).
-        ts_ns = now_ns()
-
-        # Write raw frame to InfluxDB (debug-friendly).
-        if WRITE_RAW_FRAMES:
-            batch.append(to_line_protocol_raw(msg, ts_ns))
-
-        # Optionally decode a custom telemetry CAN message.
-        if ENABLE_TELEM_DECODE:
-            # Check if this frame matches the telemetry message ID and frame type.
-            if msg.arbitration_id == TELEM_CAN_ID and bool(msg.is_extended_id) == bool(TELEM_EXTENDED_ID):
-                fields = decode_custom_telem(msg.data)  # Decode bytes to real units
-                if fields:
-                    batch.append(to_line_protocol_telem(fields, ts_ns))  # Add telemetry point to batch
-                    print(f"[TELEM] V={fields.get('pack_voltage',0):.1f}V  SOC={fields.get('soc',0):.1f}%")
-
-        # Flush if we hit batch size or if enough time has passed.
-        if len(batch) >= BATCH_SIZE or (time.time() - last_flush) >= FLUSH_INTERVAL_S:
-            influx.write(record=batch, write_precision="ns")  # Write points in batch to InfluxDB
-            total += len(batch)                               # Count points written
-            print(f"[FLUSH] wrote {len(batch)} points (total={total})")
-            batch.clear()                                     # Reset buffer
-            last_flush = time.time()                          # Reset flush timer
+    last_flush = monotonic()
+
+    # Count telemetry frames so only every TELEM_LOG_EVERY-th one is shown (all of them at DEBUG).
+    telem_count = 0
+    log_every_telem = log.isEnabledFor(logging.DEBUG)
+
+    # Loop forever, reading CAN frames (until Ctrl+C).
+    try:
+        while True:
+            # Receive one CAN message (blocking up to timeout seconds).
+            msg = bus.recv(timeout=1.0)
+
+            # If no message arrives, periodically flush any buffered data.
+            if msg is None:
+                if n and (monotonic() - last_flush) >= FLUSH_INTERVAL_S:
+                    hand_off_batch(influx, batch)                            # Queue buffered points for writing
+                    batch.clear()                                            # Clear buffer after handing off
+                    n = 0
+                    last_flush = monotonic()                                 # Reset flush timer
+                continue
+
+            # Handle this frame, then keep going with any frames already waiting in the adapter
+            # (recv with timeout=0 doesn't wait) before going back to the flush-time check.
+            while msg is not None:
+                # Timestamp this message (in ns).
+                ts_ns = time_ns()
+
+                # Read the message's fields once into locals (attribute lookups on can.Message aren't free).
+                arb = msg.arbitration_id
+                ext = msg.is_extended_id
+                dlc = msg.dlc
+                data = msg.data
+
+                # Write raw frame to InfluxDB (debug-friendly).
+                if WRITE_RAW_FRAMES:
+                    batch += to_line_protocol_raw(arb, ext, dlc, data, ts_ns)
+                    n += 1
+
+                # Optionally decode a custom telemetry CAN message.
+                if ENABLE_TELEM_DECODE:
+                    # Check if this frame matches the telemetry message ID and frame type, and
+                    # actually carries 8 data bytes (see _TELEM_STRUCT for the layout).
+                    # Check len(data), not dlc: a remote (RTR) frame can say dlc=8 with no data at all.
+                    # (is_extended_id and TELEM_EXTENDED_ID are both already bools, so no bool() needed.)
+                    if arb == TELEM_CAN_ID and ext == TELEM_EXTENDED_ID and len(data) >= 8:
+                        # Unpack the raw field values, then add the telemetry point to the batch.
+                        pv_raw, pc_raw, soc_raw, avg_t, max_t, fault = unpack_telem(data)
+                        batch += to_line_protocol_telem(pv_raw, pc_raw, soc_raw, avg_t, max_t, fault, ts_ns)
+                        n += 1
+                        telem_count += 1
+                        if log_every_telem or telem_count % TELEM_LOG_EVERY == 0:
+                            log.info("[TELEM] V=%.1fV  SOC=%.1f%%", pv_raw / 10.0, soc_raw / 2.0)
+
+                # Hand off a full batch right away, even mid-burst.
+                if n >= BATCH_SIZE:
+                    hand_off_batch(influx, batch)                            # Queue batch for writing
+                    batch.clear()                                            # Reset buffer
+                    n = 0
+                    last_flush = monotonic()                                 # Reset flush timer
+
+                msg = bus.recv(timeout=0.0)
+
+            # Flush if enough time has passed since the last batch went out.
+            # (An empty batch isn't sent; there'd be nothing to write.)
+            if (monotonic() - last_flush) >= FLUSH_INTERVAL_S:
+                if n:
+                    hand_off_batch(influx, batch)                            # Queue batch for writing
+                    batch.clear()                                            # Reset buffer
+                    n = 0
+                last_flush = monotonic()                                     # Reset flush timer
+    finally:
+        # On the way out, hand over whatever is still buffered, then close the client, which waits
+        # (at least 10 s, see write_options above) for its pending writes to finish so the last batches aren't lost.
+        # Don't wait for a free slot here: if none is free, InfluxDB isn't keeping up anyway.
+        if n:
+            if _pending_batches.acquire(blocking=False):
+                influx.write(record=bytes(batch), write_precision="ns")
+            else:
+                log.warning("[WARN] InfluxDB is falling behind; dropped the last %d points", n)
+        influx.close()
+
+        # Any slot we can't take back now belongs to a batch that never got written.
+        unsent = sum(1 for _ in range(MAX_PENDING_BATCHES) if not _pending_batches.acquire(blocking=False))
+        if unsent:
+            log.warning("[WARN] InfluxDB didn't accept %d batches before exit; they were dropped", unsent)
+        bus.shutdown()
 
 
 # Standard Python entry point guard.